@@ -7,34 +7,52 @@ Last Updated: 2025-07-03
 Added: Security improvements, logging, request validation
 
 Deploy this file to: ~/public_html/drive-airtable/
-Run with: python3 app.py
+Run with: python3 app.py  (validates config, then execs gunicorn with wsgi:app)
+Local dev server: FLASK_DEV=1 python3 app.py
 """
 
 import os
 import sys
 import io
+import re
 import base64
 import requests
 import tempfile
 import datetime
-import json
-import hashlib
 import hmac
+import importlib.util
 import logging
+import mimetypes
+import mmap
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_EXCEPTION, Future, ThreadPoolExecutor, wait
 from datetime import datetime as dt
+from urllib.parse import quote
 
 # Add local lib directory to Python path for installed packages
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'lib'))
 
-# Import PyPDF2 after adding lib to path
-import PyPDF2
+# Import PyMuPDF after adding lib to path
+import fitz  # PyMuPDF
 
 from flask import Flask, request, jsonify, send_file
+from flask.json.provider import DefaultJSONProvider
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from google.auth.transport.requests import AuthorizedSession, Request as GoogleAuthRequest
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
 from dotenv import load_dotenv
 
+try:
+    import orjson
+except ImportError:  # Fall back to Flask's stdlib json provider
+    orjson = None
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -47,16 +65,32 @@ def load_env():
     env_file = '.env'
     if os.path.exists(env_file):
         with open(env_file, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#') and '=' in line:
-                    key, value = line.split('=', 1)
-                    os.environ[key] = value.strip()
+            # KEY=value lines only - comments, blank lines and lines without '=' are skipped
+            os.environ.update(
+                (key, value.strip())
+                for key, sep, value in (line.strip().partition('=') for line in f)
+                if sep and key and not key.startswith('#')
+            )
         logger.info("Environment variables loaded from .env file")
 
 load_env()
 
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson (used by jsonify and request.json)"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=self.default), mimetype=self.mimetype)
+
 app = Flask(__name__)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
 
 # Configuration
 GOOGLE_CREDENTIALS_PATH = os.getenv('GOOGLE_CREDENTIALS_PATH', 'google_credentials.json')
@@ -64,21 +98,115 @@ AIRTABLE_API_KEY = os.getenv('AIRTABLE_API_KEY')
 AIRTABLE_BASE_ID = os.getenv('AIRTABLE_BASE_ID')
 AIRTABLE_TABLE_NAME = os.getenv('AIRTABLE_TABLE_NAME', 'Files')
 TEMP_FILES_DIR = os.getenv('TEMP_FILES_DIR', './temp_files')
+PUBLIC_ATTACHMENTS_URL = os.getenv('PUBLIC_ATTACHMENTS_URL', 'https://api.officeours.co.il/api/attachments').rstrip('/')
+ATTACHMENTS_ACCEL_PREFIX = os.getenv('ATTACHMENTS_ACCEL_PREFIX', '').rstrip('/')  # nginx internal location, if any
 DEBUG_SAVE_FILES = os.getenv('DEBUG_SAVE_FILES', 'false').lower() == 'true'
 WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')  # Optional webhook validation
 FLASK_SERVER_TOKEN = os.getenv('FLASK_SERVER_TOKEN')  # Bearer token for API authentication
 
+# Secrets encoded once for the per-request auth checks
+_WEBHOOK_SECRET_BYTES = WEBHOOK_SECRET.encode('utf-8') if WEBHOOK_SECRET else None
+_FLASK_SERVER_TOKEN_BYTES = FLASK_SERVER_TOKEN.encode('utf-8') if FLASK_SERVER_TOKEN else None
+
 # Ensure temp directory exists
 os.makedirs(TEMP_FILES_DIR, exist_ok=True)
 
+# Shared HTTP session for Airtable (keeps TLS connections alive between requests)
+AIRTABLE_TIMEOUT = (5, 30)  # (connect, read) seconds
+AIRTABLE_SESSION = requests.Session()
+AIRTABLE_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=100,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=frozenset(['GET', 'PATCH'])
+    )
+))
+
+# Airtable endpoints and headers are fixed for the life of the process
+AIRTABLE_TABLE_URL = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{AIRTABLE_TABLE_NAME}"
+AIRTABLE_HEADERS = {
+    'Authorization': f'Bearer {AIRTABLE_API_KEY}',
+    'Content-Type': 'application/json'
+}
+AIRTABLE_SESSION.headers.update(AIRTABLE_HEADERS)
+
+# Airtable's uploadAttachment endpoint accepts files up to 5 MB
+AIRTABLE_UPLOAD_MAX_BYTES = 5 * 1024 * 1024
+AIRTABLE_ATTACHMENT_FIELD = "File for AI Analysis"
+# Background jobs ("async": true) write their outcome to this field so failures don't vanish into the log
+AIRTABLE_STATUS_FIELD = os.getenv('AIRTABLE_STATUS_FIELD', 'Processing Status')
+AIRTABLE_UPLOAD_URL_PREFIX = f"https://content.airtable.com/v0/{AIRTABLE_BASE_ID}"
+AIRTABLE_UPLOAD_URL_SUFFIX = f"{quote(AIRTABLE_ATTACHMENT_FIELD, safe='')}/uploadAttachment"
+
+# Side requests to Drive (e.g. metadata lookups) overlap the main download on this pool
+DRIVE_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix='drive')
+
+# Background processing for /download-and-analyze-vision requests sent with "async": true
+BACKGROUND_JOB_WORKERS = int(os.getenv('BACKGROUND_JOB_WORKERS', '16'))
+JOB_EXECUTOR = ThreadPoolExecutor(max_workers=BACKGROUND_JOB_WORKERS, thread_name_prefix='job')
+
+# Drive metadata lookups are cached briefly (names change on rename, so keep it short)
+DRIVE_METADATA_TTL_SECONDS = 60
+DRIVE_METADATA_CACHE_SIZE = 1024
+
+# Regular Drive files are fetched as byte ranges of this size - files up to it take a
+# single GET, larger ones have their remaining ranges downloaded in parallel
+DRIVE_SINGLE_REQUEST_MAX_BYTES = 10 * 1024 * 1024
+DRIVE_MEDIA_URL = 'https://www.googleapis.com/drive/v3/files/{}?alt=media&supportsAllDrives=true'
+DRIVE_MEDIA_TIMEOUT = (5, 120)
+# Ranges of large files get their own pool so they never queue ahead of DRIVE_EXECUTOR's
+# quick metadata/permission lookups
+DRIVE_RANGE_WORKERS = int(os.getenv('DRIVE_RANGE_WORKERS', '8'))
+DRIVE_RANGE_EXECUTOR = ThreadPoolExecutor(max_workers=DRIVE_RANGE_WORKERS, thread_name_prefix='drive-range')
+
+# Content types for served attachments (anything else is sent as application/octet-stream)
+ATTACHMENT_MIME_TYPES = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.pdf': 'application/pdf',
+    '.txt': 'text/plain',
+    '.md': 'text/plain',
+}
+
+# Google Workspace types exported as PDF, with the extension Drive shows for them
+GDOC_EXTENSIONS = {
+    'application/vnd.google-apps.document': '.gdoc',
+    'application/vnd.google-apps.spreadsheet': '.gsheet',
+    'application/vnd.google-apps.presentation': '.gslides',
+}
+
+# File id in Drive share links: .../file/d/<id>/view, .../open?id=<id>, ...&id=<id>
+DRIVE_ID_RE = re.compile(r'(?:/d/|[?&]id=)([a-zA-Z0-9_-]{20,})')
+
+# Old temp files and attachments are removed by a background thread at this interval
+TEMP_CLEANUP_INTERVAL_SECONDS = 60
+
+# Field updates are coalesced into multi-record PATCH requests
+AIRTABLE_BATCH_SIZE = 10  # Airtable's per-request record limit
+AIRTABLE_BATCH_WINDOW_SECONDS = 0.05
+
+# Attachments in one /upload-to-drive request are transferred concurrently
+ATTACHMENT_TRANSFER_WORKERS = int(os.getenv('ATTACHMENT_TRANSFER_WORKERS', '4'))
+ATTACHMENT_EXECUTOR = ThreadPoolExecutor(max_workers=ATTACHMENT_TRANSFER_WORKERS, thread_name_prefix='attachment')
+
+# Required webhook fields per endpoint
+REQUIRED_VISION_FIELDS = ('record_id',)
+REQUIRED_RENAME_FIELDS = ('file_id', 'new_name')
+REQUIRED_FILE_FIELDS = ('file_id',)
+
 def validate_request_data(data, required_fields):
     """Validate that request contains required fields"""
     if not data:
         return False, "No data provided"
     
-    missing_fields = [field for field in required_fields if not data.get(field)]
-    if missing_fields:
-        return False, f"Missing required fields: {', '.join(missing_fields)}"
+    for field in required_fields:
+        if not data.get(field):
+            return False, f"Missing required fields: {field}"
     
     return True, None
 
@@ -92,11 +220,7 @@ def validate_webhook_signature(request_data, signature_header):
         return False
     
     # Generate expected signature
-    expected_signature = hmac.new(
-        WEBHOOK_SECRET.encode('utf-8'),
-        request_data,
-        hashlib.sha256
-    ).hexdigest()
+    expected_signature = hmac.digest(_WEBHOOK_SECRET_BYTES, request_data, 'sha256').hex()
     
     # Compare signatures
     provided_signature = signature_header.replace('sha256=', '')
@@ -123,7 +247,7 @@ def validate_bearer_token(auth_header):
             logger.warning(f"Invalid auth type: {auth_type}")
             return False
         
-        is_valid = hmac.compare_digest(token, FLASK_SERVER_TOKEN)
+        is_valid = hmac.compare_digest(token.encode('utf-8'), _FLASK_SERVER_TOKEN_BYTES)
         if not is_valid:
             logger.warning("Invalid bearer token")
         return is_valid
@@ -131,137 +255,398 @@ def validate_bearer_token(auth_header):
         logger.warning(f"Bearer token validation error: {e}")
         return False
 
+def load_signed_json(endpoint):
+    """Read the request body once, verify its webhook signature and parse it as JSON
+    
+    Returns (data, None) on success or (None, error_response) on failure;
+    an empty body or one that isn't a JSON object is a 400.
+    """
+    raw_body = request.get_data(cache=True)
+    
+    # Validate webhook signature if configured
+    if WEBHOOK_SECRET:
+        signature = request.headers.get('X-Hub-Signature-256')
+        if not validate_webhook_signature(raw_body, signature):
+            logger.warning(f"Invalid webhook signature for {endpoint}")
+            return None, (jsonify({"error": "Invalid signature"}), 401)
+    
+    if not raw_body:
+        return None, (jsonify({"error": "No data provided"}), 400)
+    
+    try:
+        data = app.json.loads(raw_body)
+    except ValueError:
+        logger.warning(f"Invalid JSON body for {endpoint}")
+        return None, (jsonify({"error": "Invalid JSON body"}), 400)
+    
+    if not isinstance(data, dict):
+        logger.warning(f"JSON body for {endpoint} is not an object")
+        return None, (jsonify({"error": "JSON body must be an object"}), 400)
+    
+    return data, None
+
+# Google clients are built once and reused across requests
+_drive_credentials = None
+_drive_credentials_lock = threading.Lock()
+_drive_local = threading.local()  # httplib2 is not thread-safe, so one service per thread
+
+def get_drive_credentials():
+    """Load service account credentials once per process"""
+    global _drive_credentials
+    if _drive_credentials is None:
+        with _drive_credentials_lock:
+            if _drive_credentials is None:
+                _drive_credentials = service_account.Credentials.from_service_account_file(
+                    GOOGLE_CREDENTIALS_PATH,
+                    scopes=['https://www.googleapis.com/auth/drive']
+                )
+    return _drive_credentials
+
+_drive_http = None
+
+def get_drive_http_session():
+    """Return the shared authorized requests session used for Drive media downloads"""
+    global _drive_http
+    if _drive_http is None:
+        credentials = get_drive_credentials()
+        with _drive_credentials_lock:
+            if _drive_http is None:
+                session = AuthorizedSession(credentials)
+                session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=32))
+                _drive_http = session
+    return _drive_http
+
+def warm_up_drive_clients():
+    """Load credentials and fetch an access token before the first request (gunicorn post_worker_init)"""
+    try:
+        session = get_drive_http_session()
+        session.credentials.refresh(GoogleAuthRequest())
+        logger.info("Google Drive credentials loaded and access token fetched")
+    except Exception as e:
+        logger.warning(f"Drive warm-up failed, clients will be set up on first request: {e}")
+
 def get_drive_service():
-    credentials = service_account.Credentials.from_service_account_file(
-        GOOGLE_CREDENTIALS_PATH,
-        scopes=['https://www.googleapis.com/auth/drive']
-    )
-    return build('drive', 'v3', credentials=credentials)
+    """Return the cached Google Drive service for the current thread"""
+    service = getattr(_drive_local, 'service', None)
+    if service is None:
+        service = build('drive', 'v3', credentials=get_drive_credentials(), cache_discovery=False)
+        _drive_local.service = service
+    return service
+
+
+class _SafeNameTable(dict):
+    """str.translate table keeping letters (incl. Hebrew), digits and ' -_.'
 
+    Each code point is classified once and remembered, so translate stays in C.
+    """
+    def __missing__(self, codepoint):
+        char = chr(codepoint)
+        self[codepoint] = codepoint if char.isalnum() or char in ' -_.' else None
+        return self[codepoint]
 
-def save_debug_file(file_content, file_name, file_id):
-    """Save file to temp directory for debugging if enabled"""
+_SAFE_NAME_TABLE = _SafeNameTable()
+
+def save_debug_file(file_path, file_name, file_id):
+    """Keep a copy of a downloaded file in the temp directory for debugging if enabled
+    
+    The copy is a hard link, so no bytes are written.
+    """
     if not DEBUG_SAVE_FILES:
         return None
         
     try:
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_name = "".join(c for c in file_name if c.isalnum() or c in (' ', '-', '_', '.')).rstrip()
+        safe_name = file_name.translate(_SAFE_NAME_TABLE).rstrip()
         debug_filename = f"{timestamp}_{file_id}_{safe_name}"
         debug_path = os.path.join(TEMP_FILES_DIR, debug_filename)
         
-        with open(debug_path, 'wb') as f:
-            f.write(file_content)
+        os.link(file_path, debug_path)
         
-        print(f"DEBUG: Saved file to {debug_path}")
+        logger.debug("Saved debug file to %s", debug_path)
         return debug_path
     except Exception as e:
-        print(f"DEBUG: Failed to save file: {e}")
+        logger.warning(f"Failed to save debug file: {e}")
         return None
 
+def _remove_files_older_than(directory, cutoff, debug_message):
+    """Remove regular files in directory whose ctime is before cutoff"""
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                if entry.is_file(follow_symlinks=False) and entry.stat().st_ctime < cutoff:
+                    os.remove(entry.path)
+                    if debug_enabled:
+                        logger.debug(debug_message, entry.name)
+            except FileNotFoundError:
+                pass  # Removed meanwhile by another worker's cleanup
+
+_cleanup_lock = threading.Lock()
+
 def cleanup_old_temp_files(max_age_hours=24):
     """Remove temp files older than max_age_hours"""
     try:
-        current_time = datetime.datetime.now()
-        
-        # Clean up main temp directory
-        for filename in os.listdir(TEMP_FILES_DIR):
-            filepath = os.path.join(TEMP_FILES_DIR, filename)
-            if os.path.isfile(filepath):
-                file_time = datetime.datetime.fromtimestamp(os.path.getctime(filepath))
-                if (current_time - file_time).total_seconds() > (max_age_hours * 3600):
-                    os.remove(filepath)
-                    print(f"Cleaned up old temp file: {filename}")
-        
-        # Clean up attachments directory (short retention - automation downloads immediately)
-        attachments_dir = os.path.join(TEMP_FILES_DIR, 'attachments')
-        if os.path.exists(attachments_dir):
-            # Keep attachments for only 5 minutes - automation downloads immediately
-            attachment_max_age_seconds = 5 * 60  # 5 minutes
-            for filename in os.listdir(attachments_dir):
-                filepath = os.path.join(attachments_dir, filename)
-                if os.path.isfile(filepath):
-                    file_time = datetime.datetime.fromtimestamp(os.path.getctime(filepath))
-                    if (current_time - file_time).total_seconds() > attachment_max_age_seconds:
-                        os.remove(filepath)
-                        print(f"Cleaned up attachment file after 5 minutes: {filename}")
+        with _cleanup_lock:
+            current_time = time.time()
+            
+            # Clean up main temp directory
+            _remove_files_older_than(TEMP_FILES_DIR, current_time - max_age_hours * 3600,
+                                     "Cleaned up old temp file: %s")
+            
+            # Clean up attachments directory (short retention - automation downloads immediately)
+            attachments_dir = os.path.join(TEMP_FILES_DIR, 'attachments')
+            if os.path.exists(attachments_dir):
+                # Keep attachments for only 5 minutes - automation downloads immediately
+                attachment_max_age_seconds = 5 * 60  # 5 minutes
+                _remove_files_older_than(attachments_dir, current_time - attachment_max_age_seconds,
+                                         "Cleaned up attachment file after 5 minutes: %s")
                         
     except Exception as e:
-        print(f"Cleanup error: {e}")
+        logger.error(f"Cleanup error: {e}")
+
+_temp_cleanup_started = False
+_temp_cleanup_start_lock = threading.Lock()
+
+def _temp_cleanup_worker():
+    """Periodically remove old temp files and expired attachments"""
+    while True:
+        time.sleep(TEMP_CLEANUP_INTERVAL_SECONDS)
+        cleanup_old_temp_files()
+
+def _ensure_temp_cleanup():
+    """Start the cleanup thread on first use (after any gunicorn fork)"""
+    global _temp_cleanup_started
+    if _temp_cleanup_started:
+        return
+    with _temp_cleanup_start_lock:
+        if not _temp_cleanup_started:
+            threading.Thread(target=_temp_cleanup_worker, name='temp-cleanup', daemon=True).start()
+            _temp_cleanup_started = True
+
+def extract_file_id(drive_url):
+    """Extract the Drive file id from a share URL, or None if it has none"""
+    match = DRIVE_ID_RE.search(drive_url)
+    return match.group(1) if match else None
+
+_drive_metadata_cache = {}  # file_id -> (expires_at, metadata)
+_drive_metadata_lock = threading.Lock()
+
+def get_drive_file_metadata(file_id):
+    """Get the file metadata needed for downloading (supportsAllDrives for Shared Drive access)
+    
+    Results are cached briefly so webhook retries for the same file skip the lookup.
+    """
+    now = time.monotonic()
+    with _drive_metadata_lock:
+        cached = _drive_metadata_cache.get(file_id)
+    if cached and cached[0] > now:
+        return cached[1]
+    
+    file_metadata = get_drive_service().files().get(
+        fileId=file_id,
+        fields='name,mimeType',
+        supportsAllDrives=True
+    ).execute()
+    
+    with _drive_metadata_lock:
+        if len(_drive_metadata_cache) >= DRIVE_METADATA_CACHE_SIZE:
+            # Drop expired entries, or everything if all are still fresh
+            expired = [key for key, (expires_at, _) in _drive_metadata_cache.items() if expires_at <= now]
+            for key in expired or list(_drive_metadata_cache):
+                del _drive_metadata_cache[key]
+        _drive_metadata_cache[file_id] = (now + DRIVE_METADATA_TTL_SECONDS, file_metadata)
+    
+    return file_metadata
+
+def forget_drive_file_metadata(file_id):
+    """Drop cached metadata after the file is renamed or deleted"""
+    with _drive_metadata_lock:
+        _drive_metadata_cache.pop(file_id, None)
+
+def _write_response_at(response, fd, offset):
+    """Stream a response body into fd starting at offset; returns bytes written"""
+    written = 0
+    for chunk in response.iter_content(chunk_size=1024 * 1024):
+        os.pwrite(fd, chunk, offset + written)
+        written += len(chunk)
+    return written
+
+def download_drive_media(file_id, out_file):
+    """Download a regular (non-Workspace) Drive file into out_file with HTTP range requests
+    
+    The first range also reports the total size; any remaining ranges are
+    fetched in parallel on DRIVE_RANGE_EXECUTOR and written at their own offsets.
+    Returns the number of bytes downloaded.
+    Raises requests.HTTPError if Drive refuses the download.
+    """
+    session = get_drive_http_session()
+    url = DRIVE_MEDIA_URL.format(quote(file_id, safe=''))  # file_id comes from the webhook payload
+    part_size = DRIVE_SINGLE_REQUEST_MAX_BYTES
+    fd = out_file.fileno()
+    
+    with session.get(url, headers={'Range': f'bytes=0-{part_size - 1}'}, stream=True, timeout=DRIVE_MEDIA_TIMEOUT) as response:
+        if response.status_code == 416:  # Range not satisfiable - empty file
+            return 0
+        response.raise_for_status()
+        total_size = response.headers.get('Content-Range', '').rpartition('/')[2]
+        written = _write_response_at(response, fd, 0)
+    if response.status_code != 206 or not total_size.isdigit():
+        # Whole file in one response (ranges not honoured)
+        return written
+    
+    total_size = int(total_size)
+    if written != min(part_size, total_size):
+        raise IOError(f"Short range response for {file_id}: bytes 0-{min(part_size, total_size) - 1}")
+    if total_size <= part_size:
+        return written
+    
+    def fetch_range(start):
+        end = min(start + part_size, total_size)
+        with session.get(url, headers={'Range': f'bytes={start}-{end - 1}'}, stream=True, timeout=DRIVE_MEDIA_TIMEOUT) as part:
+            part.raise_for_status()
+            if _write_response_at(part, fd, start) != end - start:
+                raise IOError(f"Short range response for {file_id}: bytes {start}-{end - 1}")
+    
+    futures = [DRIVE_RANGE_EXECUTOR.submit(fetch_range, start) for start in range(part_size, total_size, part_size)]
+    done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+    if not_done:
+        # A range failed - stop the rest and let running ones finish before the
+        # caller closes or truncates out_file, so nothing writes to a stale fd
+        for future in not_done:
+            future.cancel()
+        wait(not_done)
+    for future in futures:
+        if not future.cancelled():
+            future.result()
+    
+    logger.info(f"Downloaded {file_id} in {len(futures) + 1} ranges ({total_size} bytes)")
+    return total_size
 
-def download_file_from_drive(file_id):
-    """Download file content from Google Drive"""
+def download_file_from_drive(file_id, file_name=None, mime_type=None):
+    """Download a file from Google Drive into a temp file under TEMP_FILES_DIR
+    
+    Returns (file_path, file_name, error). The content is streamed straight to
+    disk; the caller owns the file (upload_file_to_airtable moves it into the
+    attachments directory).
+    
+    If the caller already knows file_name and mime_type (e.g. from the webhook
+    payload) the metadata round-trip is skipped for regular files. Otherwise the
+    metadata lookup runs in parallel with the media download.
+    """
+    out_file = None
     try:
         service = get_drive_service()
+        out_file = tempfile.NamedTemporaryFile(dir=TEMP_FILES_DIR, prefix='download_', delete=False)
 
-        # Get file metadata (supportsAllDrives for Shared Drive access)
-        file_metadata = service.files().get(fileId=file_id, supportsAllDrives=True).execute()
-        file_name = file_metadata.get('name')
-        mime_type = file_metadata.get('mimeType')
+        downloaded = False
+        if not file_name or not mime_type or mime_type.startswith('application/vnd.google-apps'):
+            metadata_future = DRIVE_EXECUTOR.submit(get_drive_file_metadata, file_id)
+            
+            # Start downloading while the metadata is in flight - Workspace files
+            # reject get_media and are exported below once the mime type is known
+            if not (mime_type or '').startswith('application/vnd.google-apps'):
+                try:
+                    download_drive_media(file_id, out_file)
+                    downloaded = True
+                except requests.HTTPError as e:
+                    logger.info(f"Direct media download unavailable for {file_id} (HTTP {e.response.status_code})")
+            
+            file_metadata = metadata_future.result()
+            file_name = file_metadata.get('name')
+            mime_type = file_metadata.get('mimeType')
         
         logger.info(f"Google Drive filename: '{file_name}' (mime: {mime_type})")
         
-        # Handle Google Workspace files (export as PDF)
-        if mime_type.startswith('application/vnd.google-apps'):
-            if 'document' in mime_type:
-                request = service.files().export_media(fileId=file_id, mimeType='application/pdf')
-                file_name = file_name.replace('.gdoc', '.pdf') if '.gdoc' in file_name else f"{file_name}.pdf"
-            elif 'spreadsheet' in mime_type:
-                request = service.files().export_media(fileId=file_id, mimeType='application/pdf')
-                file_name = file_name.replace('.gsheet', '.pdf') if '.gsheet' in file_name else f"{file_name}.pdf"
-            elif 'presentation' in mime_type:
+        if not downloaded:
+            out_file.seek(0)
+            out_file.truncate()
+            
+            # Handle Google Workspace files (export as PDF)
+            if mime_type.startswith('application/vnd.google-apps'):
+                gdoc_ext = GDOC_EXTENSIONS.get(mime_type)
+                if gdoc_ext is None:
+                    raise ValueError("Unsupported Google Workspace file type")
+                root, ext = os.path.splitext(file_name)
+                file_name = f"{root}.pdf" if ext == gdoc_ext else f"{file_name}.pdf"
+                
+                # Exports have no size up front and no range support - download in chunks
                 request = service.files().export_media(fileId=file_id, mimeType='application/pdf')
-                file_name = file_name.replace('.gslides', '.pdf') if '.gslides' in file_name else f"{file_name}.pdf"
+                downloader = MediaIoBaseDownload(out_file, request)
+                done = False
+                while done is False:
+                    status, done = downloader.next_chunk()
             else:
-                return None, None, "Unsupported Google Workspace file type"
-        else:
-            # Regular file download
-            request = service.files().get_media(fileId=file_id)
-        
-        # Download the file
-        file_content = io.BytesIO()
-        downloader = MediaIoBaseDownload(file_content, request)
-        done = False
-        while done is False:
-            status, done = downloader.next_chunk()
+                # Regular file download
+                download_drive_media(file_id, out_file)
         
-        file_content.seek(0)
-        file_data = file_content.getvalue()
+        out_file.close()
         
         # Optionally save for debugging
-        save_debug_file(file_data, file_name, file_id)
+        save_debug_file(out_file.name, file_name, file_id)
         
-        return file_data, file_name, None
+        return out_file.name, file_name, None
         
     except Exception as e:
+        if out_file is not None:
+            out_file.close()
+            os.remove(out_file.name)
         return None, None, str(e)
 
-def upload_to_airtable_attachment(file_content, file_name, record_id):
-    """Upload file to Airtable as attachment"""
+def build_base64_body(head, file_content, tail, chunk_size=3 * 256 * 1024):
+    """Return head + base64(file_content) + tail in a single preallocated buffer
+    
+    The content is encoded in chunks (chunk_size must be a multiple of 3) so the
+    full base64 copy never exists alongside the final body.
+    """
+    encoded_size = 4 * ((len(file_content) + 2) // 3)
+    body = bytearray(len(head) + encoded_size + len(tail))
+    body[:len(head)] = head
+    
+    offset = len(head)
+    with memoryview(file_content) as view:
+        for start in range(0, len(view), chunk_size):
+            encoded = base64.b64encode(view[start:start + chunk_size])
+            body[offset:offset + len(encoded)] = encoded
+            offset += len(encoded)
+    
+    body[offset:] = tail
+    return body
+
+def upload_to_airtable_attachment(file_path, file_name, record_id, mime_type=None):
+    """Upload a downloaded file (see download_file_from_drive) to Airtable as attachment"""
     try:
-        # Convert file to base64
-        file_base64 = base64.b64encode(file_content).decode('utf-8')
-        
-        # Create attachment object
-        attachment = {
-            "url": f"data:application/octet-stream;base64,{file_base64}",
-            "filename": file_name
-        }
+        if not mime_type:
+            mime_type = mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
         
-        # Update Airtable record
-        url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{AIRTABLE_TABLE_NAME}/{record_id}"
-        headers = {
-            'Authorization': f'Bearer {AIRTABLE_API_KEY}',
-            'Content-Type': 'application/json'
-        }
+        # Serve the file from our attachments URL and let Airtable fetch it -
+        # the PATCH then carries only the URL, not the file bytes
+        file_attachment = upload_file_to_airtable(file_path, file_name, mime_type)
+        if file_attachment:
+            attachment = {"url": file_attachment['url'], "filename": file_name}
+            return update_airtable_field(record_id, AIRTABLE_ATTACHMENT_FIELD, [attachment])
         
-        data = {
-            "fields": {
-                "File for AI Analysis": [attachment]
-            }
-        }
+        # Hosting failed: upload small files directly to the attachment field
+        try:
+            file_size = os.path.getsize(file_path)
+            if file_size > AIRTABLE_UPLOAD_MAX_BYTES:
+                return False, "Failed to host file for Airtable"
+            
+            logger.warning(f"Falling back to direct Airtable upload for {file_name}")
+            
+            # Build the JSON body as bytes - base64 output is JSON-safe, so it is spliced
+            # in directly instead of being decoded to str and re-escaped by the encoder.
+            # The file is mapped rather than read, so its bytes are encoded from the page cache.
+            body_head = app.json.dumps({"contentType": mime_type, "filename": file_name})[:-1].encode('utf-8') + b', "file": "'
+            if file_size:
+                with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as file_content:
+                    body = build_base64_body(body_head, file_content, b'"}')
+            else:
+                body = build_base64_body(body_head, b'', b'"}')  # mmap can't map empty files
+        finally:
+            os.remove(file_path)
         
-        response = requests.patch(url, headers=headers, json=data)
+        url = f"{AIRTABLE_UPLOAD_URL_PREFIX}/{record_id}/{AIRTABLE_UPLOAD_URL_SUFFIX}"
+        response = AIRTABLE_SESSION.post(url, data=body, timeout=AIRTABLE_TIMEOUT)
         
         if response.status_code == 200:
             return True, "File uploaded successfully"
@@ -282,6 +667,7 @@ def rename_file_in_drive(file_id, new_name):
             body=body,
             supportsAllDrives=True
         ).execute()
+        forget_drive_file_metadata(file_id)
         
         return True, f"File renamed to: {updated_file.get('name')}"
         
@@ -309,6 +695,7 @@ def delete_file_from_drive(file_id):
             fileId=file_id,
             supportsAllDrives=True
         ).execute()
+        forget_drive_file_metadata(file_id)
 
         logger.info(f"Permanently deleted file '{file_name}' ({file_id})")
         return True, f"File '{file_name}' permanently deleted"
@@ -323,18 +710,17 @@ def delete_file_from_drive(file_id):
 
 
 def extract_text_from_pdf(file_content):
-    """Extract text from PDF using PyPDF2"""
+    """Extract text from PDF using PyMuPDF"""
     try:
-        pdf_file = io.BytesIO(file_content)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
+        with fitz.open(stream=file_content, filetype="pdf") as pdf_document:
+            page_texts = []
+            for page in pdf_document:
+                page_text = page.get_text("text")
+                if page_text.strip():
+                    page_texts.append(page_text)
         
-        text = ""
-        for page_num, page in enumerate(pdf_reader.pages):
-            page_text = page.extract_text()
-            if page_text.strip():
-                text += page_text + "\n"
-        
-        extracted_text = text.strip() if text.strip() else None
+        text = "\n".join(page_texts).strip()
+        extracted_text = text if text else None
         
         return extracted_text
     except Exception as e:
@@ -346,7 +732,6 @@ def extract_text_with_easyocr(file_content, file_name):
     try:
         import easyocr
         from PIL import Image
-        import fitz  # PyMuPDF
         
         logger.info(f"Using EasyOCR fallback for {file_name}")
         
@@ -386,33 +771,111 @@ def extract_text_with_easyocr(file_content, file_name):
 
 
 
-def update_airtable_field(record_id, field_name, field_value):
-    """Update a specific field in an Airtable record"""
+def update_airtable_records(records):
+    """Update several Airtable records, sending up to 10 records per PATCH
+    
+    records: list of (record_id, fields_dict) tuples
+    """
     try:
-        url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{AIRTABLE_TABLE_NAME}/{record_id}"
-        headers = {
-            'Authorization': f'Bearer {AIRTABLE_API_KEY}',
-            'Content-Type': 'application/json'
-        }
-        
-        data = {
-            "fields": {
-                field_name: field_value
+        for start in range(0, len(records), AIRTABLE_BATCH_SIZE):
+            batch = records[start:start + AIRTABLE_BATCH_SIZE]
+            data = {
+                "records": [{"id": record_id, "fields": fields} for record_id, fields in batch]
             }
-        }
+            
+            response = AIRTABLE_SESSION.patch(AIRTABLE_TABLE_URL, json=data, timeout=AIRTABLE_TIMEOUT)
+            
+            if response.status_code != 200:
+                return False, f"Airtable API error: {response.text}"
         
-        response = requests.patch(url, headers=headers, json=data)
+        return True, "Records updated successfully"
         
-        if response.status_code == 200:
-            return True, "Field updated successfully"
+    except Exception as e:
+        return False, str(e)
+
+_airtable_update_queue = queue.Queue()
+_airtable_batcher_started = False
+_airtable_batcher_lock = threading.Lock()
+
+def _airtable_batch_worker():
+    """Drain queued field updates and flush them as multi-record PATCHes"""
+    while True:
+        pending = [_airtable_update_queue.get()]
+        deadline = time.monotonic() + AIRTABLE_BATCH_WINDOW_SECONDS
+        
+        # Collect more updates until the window closes or the batch is full
+        while len(pending) < AIRTABLE_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending.append(_airtable_update_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        
+        try:
+            # Merge updates for the same record - Airtable rejects duplicate ids in one request
+            merged = {}
+            for record_id, fields, _ in pending:
+                merged.setdefault(record_id, {}).update(fields)
+            
+            result = update_airtable_records(list(merged.items()))
+            if result[0] or len(merged) == 1:
+                results = dict.fromkeys(merged, result)
+            else:
+                # Airtable fails the whole PATCH for one bad record (deleted id, invalid
+                # field) - retry each record alone so unrelated callers aren't failed with it
+                results = {record_id: update_airtable_records([(record_id, fields)])
+                           for record_id, fields in merged.items()}
+            
+            for record_id, _, future in pending:
+                future.set_result(results[record_id])
+        except Exception as e:
+            logger.error(f"Airtable batch update failed: {str(e)}")
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+
+def _ensure_airtable_batcher():
+    """Start the batch worker on first use (after any gunicorn fork)"""
+    global _airtable_batcher_started
+    if _airtable_batcher_started:
+        return
+    with _airtable_batcher_lock:
+        if not _airtable_batcher_started:
+            threading.Thread(target=_airtable_batch_worker, name='airtable-batcher', daemon=True).start()
+            _airtable_batcher_started = True
+
+def update_airtable_fields(record_id, fields):
+    """Update several fields of an Airtable record in one PATCH
+    
+    The update is queued and sent together with any other updates arriving
+    in the same short window; this call blocks until it has been applied.
+    """
+    if not isinstance(fields, dict):
+        return False, "fields must be a dict of field name to value"
+    
+    try:
+        _ensure_airtable_batcher()
+        future = Future()
+        _airtable_update_queue.put((record_id, fields, future))
+        success, message = future.result()
+        
+        if success:
+            return True, "Fields updated successfully"
         else:
-            return False, f"Airtable API error: {response.text}"
+            return False, message
             
     except Exception as e:
         return False, str(e)
 
-def upload_file_to_airtable(file_content, file_name, mime_type):
-    """Save file locally and return attachment object with public URL"""
+def update_airtable_field(record_id, field_name, field_value):
+    """Update a specific field in an Airtable record (see update_airtable_fields)"""
+    success, message = update_airtable_fields(record_id, {field_name: field_value})
+    return (True, "Field updated successfully") if success else (False, message)
+
+def upload_file_to_airtable(file_path, file_name, mime_type):
+    """Move a downloaded file into the attachments directory and return attachment object with public URL"""
     try:
         logger.info(f"Using original filename from Google Drive: {file_name}")
 
@@ -421,20 +884,18 @@ def upload_file_to_airtable(file_content, file_name, mime_type):
         os.makedirs(attachments_dir, exist_ok=True)
 
         # Generate unique filename to avoid conflicts
-        import uuid
         unique_id = str(uuid.uuid4())[:8]
         unique_filename = f"{unique_id}_{file_name}"
 
-        # Save file to attachments directory
-        file_path = os.path.join(attachments_dir, unique_filename)
-        with open(file_path, 'wb') as f:
-            f.write(file_content)
+        # Move the downloaded file into the attachments directory (same filesystem - no copy)
+        attachment_path = os.path.join(attachments_dir, unique_filename)
+        os.replace(file_path, attachment_path)
 
-        # Clean up old attachments immediately
-        cleanup_old_temp_files()
+        # Old attachments are removed by the background cleanup thread
+        _ensure_temp_cleanup()
 
         # Create public URL that Airtable can access
-        public_url = f"https://api.officeours.co.il/api/attachments/{unique_filename}"
+        public_url = f"{PUBLIC_ATTACHMENTS_URL}/{quote(unique_filename)}"
 
         logger.info(f"Saved {file_name} as {unique_filename}, public URL: {public_url}")
 
@@ -442,7 +903,7 @@ def upload_file_to_airtable(file_content, file_name, mime_type):
         return {
             'url': public_url,
             'filename': file_name,
-            'size': len(file_content),
+            'size': os.path.getsize(attachment_path),
             'type': mime_type
         }
 
@@ -586,6 +1047,131 @@ def upload_to_drive(file_content, file_name, folder_id=None, mime_type=None):
         else:
             return False, error_msg
 
+def transfer_attachment_to_drive(idx, total, url, custom_filename, folder_id):
+    """Download one attachment URL and upload it to Google Drive
+    
+    Returns (True, result_data) or (False, error_data) for the /upload-to-drive response.
+    """
+    try:
+        # Download from Airtable URL
+        logger.info(f"Processing attachment {idx + 1}/{total}")
+        file_content, filename, mime_type, download_error = download_from_url(url)
+
+        if download_error:
+            return False, {
+                "url": url[:100],
+                "error": download_error,
+                "index": idx
+            }
+
+        # Use custom filename if provided
+        if custom_filename:
+            # Preserve extension from original filename
+            original_ext = filename.split('.')[-1] if '.' in filename else ''
+            custom_ext = custom_filename.split('.')[-1] if '.' in custom_filename else ''
+
+            # If custom filename has no extension but original does, add it
+            if not custom_ext and original_ext:
+                filename = f"{custom_filename}.{original_ext}"
+            else:
+                filename = custom_filename
+
+        # Upload to Google Drive
+        success, upload_result = upload_to_drive(file_content, filename, folder_id, mime_type)
+
+        if success:
+            logger.info(f"Successfully uploaded file {idx + 1}: {upload_result.get('file_id')}")
+            return True, {
+                "success": True,
+                "index": idx,
+                "source_url": url[:100],
+                **upload_result
+            }
+        else:
+            logger.error(f"Failed to upload file {idx + 1}: {upload_result}")
+            return False, {
+                "url": url[:100],
+                "error": upload_result,
+                "index": idx
+            }
+
+    except Exception as file_error:
+        logger.error(f"Error processing file {idx + 1}: {str(file_error)}")
+        return False, {
+            "url": url[:100],
+            "error": str(file_error),
+            "index": idx
+        }
+
+def prepare_file_for_ai(file_id, file_name=None, mime_type=None):
+    """Download a Drive file and host it for Airtable AI
+    
+    Returns (result, None) on success or (None, error_message) on failure.
+    """
+    # Download from Google Drive
+    logger.info(f"Downloading file {file_id} from Google Drive")
+    file_path, file_name, error = download_file_from_drive(file_id, file_name, mime_type)
+    if error:
+        logger.error(f"Download failed for {file_id}: {error}")
+        return None, f"Download failed: {error}"
+    
+    file_size = os.path.getsize(file_path)
+    logger.info(f"Successfully downloaded {file_name} ({file_size} bytes)")
+    
+    # Upload file to Airtable for AI processing
+    mime_type = "application/pdf" if file_name.lower().endswith('.pdf') else "image/jpeg"
+    file_attachment = upload_file_to_airtable(file_path, file_name, mime_type)
+    
+    if not file_attachment:
+        logger.error(f"Failed to upload {file_name} to Airtable")
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        return None, "Failed to upload file for AI processing"
+    
+    logger.info(f"Successfully uploaded {file_name} to Airtable for AI processing")
+    
+    return {
+        "file_name": file_name,
+        "file_id": file_id,
+        "file_attachment": file_attachment,  # AI can process this file directly
+        "file_size": file_size,
+        "mime_type": mime_type
+    }, None
+
+def report_job_failure(job_id, record_id, error):
+    """Log a failed background job and record it on the Airtable record"""
+    logger.error(f"Job {job_id} failed for record {record_id}: {error}")
+    success, message = update_airtable_field(record_id, AIRTABLE_STATUS_FIELD, f"Failed (job {job_id}): {error}")
+    if not success:
+        logger.error(f"Job {job_id} could not write its failure to record {record_id}: {message}")
+
+def process_vision_job(job_id, file_id, record_id, file_name=None, mime_type=None):
+    """Background job: prepare the file and attach it to the Airtable record
+    
+    The outcome is written to AIRTABLE_STATUS_FIELD; on success together with
+    the attachment, so a retry that succeeds replaces an earlier failure.
+    """
+    try:
+        result, error = prepare_file_for_ai(file_id, file_name, mime_type)
+        if error:
+            report_job_failure(job_id, record_id, error)
+            return
+        
+        attachment = {
+            "url": result['file_attachment']['url'],
+            "filename": result['file_name']
+        }
+        success, message = update_airtable_fields(record_id, {
+            AIRTABLE_ATTACHMENT_FIELD: [attachment],
+            AIRTABLE_STATUS_FIELD: f"Attached (job {job_id})"
+        })
+        if success:
+            logger.info(f"Job {job_id} attached {result['file_name']} to record {record_id}")
+        else:
+            report_job_failure(job_id, record_id, f"Could not attach file: {message}")
+    except Exception as e:
+        report_job_failure(job_id, record_id, str(e))
+
 @app.route('/download-and-analyze', methods=['POST'])
 def download_and_analyze():
     """Download file from Drive and upload to Airtable for AI analysis"""
@@ -597,21 +1183,22 @@ def download_and_analyze():
         
         # Extract file_id from drive_url if not provided
         if not file_id and drive_url:
-            if '/d/' in drive_url:
-                file_id = drive_url.split('/d/')[1].split('/')[0]
-            else:
+            file_id = extract_file_id(drive_url)
+            if not file_id:
                 return jsonify({"error": "Could not extract file_id from drive_url"}), 400
         
         if not file_id or not record_id:
             return jsonify({"error": "file_id and record_id are required"}), 400
         
         # Download from Google Drive
-        file_content, file_name, error = download_file_from_drive(file_id)
+        file_path, file_name, error = download_file_from_drive(
+            file_id, data.get('file_name'), data.get('mime_type')
+        )
         if error:
             return jsonify({"error": f"Download failed: {error}"}), 500
         
         # Upload to Airtable
-        success, message = upload_to_airtable_attachment(file_content, file_name, record_id)
+        success, message = upload_to_airtable_attachment(file_path, file_name, record_id)
         if not success:
             return jsonify({"error": f"Upload failed: {message}"}), 500
         
@@ -635,18 +1222,12 @@ def download_and_analyze_vision():
             logger.warning("Invalid bearer token for /download-and-analyze-vision")
             return jsonify({"error": "Unauthorized"}), 401
         
-        # Validate webhook signature if configured
-        if WEBHOOK_SECRET:
-            signature = request.headers.get('X-Hub-Signature-256')
-            if not validate_webhook_signature(request.get_data(), signature):
-                logger.warning("Invalid webhook signature for /download-and-analyze-vision")
-                return jsonify({"error": "Invalid signature"}), 401
-        
-        data = request.json
-        logger.info(f"File processing request: file_id={data.get('file_id')}, record_id={data.get('record_id')}")
+        data, error_response = load_signed_json('/download-and-analyze-vision')
+        if error_response:
+            return error_response
         
         # Validate required fields
-        is_valid, error_msg = validate_request_data(data, ['record_id'])
+        is_valid, error_msg = validate_request_data(data, REQUIRED_VISION_FIELDS)
         if not is_valid:
             logger.warning(f"Invalid request data: {error_msg}")
             return jsonify({"error": error_msg}), 400
@@ -654,11 +1235,12 @@ def download_and_analyze_vision():
         file_id = data.get('file_id')
         record_id = data.get('record_id')
         drive_url = data.get('drive_url')
+        logger.info(f"File processing request: file_id={file_id}, record_id={record_id}")
         
         # Extract file_id from drive_url if not provided
         if not file_id and drive_url:
-            if '/d/' in drive_url:
-                file_id = drive_url.split('/d/')[1].split('/')[0]
+            file_id = extract_file_id(drive_url)
+            if file_id:
                 logger.info(f"Extracted file_id from URL: {file_id}")
             else:
                 logger.error("Could not extract file_id from drive_url")
@@ -668,34 +1250,31 @@ def download_and_analyze_vision():
             logger.error("No file_id provided")
             return jsonify({"error": "file_id is required"}), 400
         
-        # Download from Google Drive
-        logger.info(f"Downloading file {file_id} from Google Drive")
-        file_content, file_name, error = download_file_from_drive(file_id)
-        if error:
-            logger.error(f"Download failed for {file_id}: {error}")
-            return jsonify({"error": f"Download failed: {error}"}), 500
-        
-        logger.info(f"Successfully downloaded {file_name} ({len(file_content)} bytes)")
-        
-        # Upload file to Airtable for AI processing
-        mime_type = "application/pdf" if file_name.lower().endswith('.pdf') else "image/jpeg"
-        file_attachment = upload_file_to_airtable(file_content, file_name, mime_type)
-        
-        if not file_attachment:
-            logger.error(f"Failed to upload {file_name} to Airtable")
-            return jsonify({"error": "Failed to upload file for AI processing"}), 500
+        # Optionally acknowledge now and finish in the background
+        if data.get('async'):
+            job_id = str(uuid.uuid4())
+            JOB_EXECUTOR.submit(
+                process_vision_job, job_id, file_id, record_id,
+                data.get('file_name'), data.get('mime_type')
+            )
+            logger.info(f"Queued background job {job_id} for file {file_id}")
+            return jsonify({
+                "success": True,
+                "message": "File queued for AI processing",
+                "job_id": job_id,
+                "file_id": file_id,
+                "record_id": record_id,
+                "processing_status": f"Queued - attachment and status will be written to Airtable ('{AIRTABLE_STATUS_FIELD}')"
+            }), 202
         
-        # Return file attachment for AI processing
-        logger.info(f"Successfully uploaded {file_name} to Airtable for AI processing")
+        result, error = prepare_file_for_ai(file_id, data.get('file_name'), data.get('mime_type'))
+        if error:
+            return jsonify({"error": error}), 500
         
         return jsonify({
             "success": True,
             "message": "File uploaded to Airtable for AI processing",
-            "file_name": file_name,
-            "file_id": file_id,
-            "file_attachment": file_attachment,  # AI can process this file directly
-            "file_size": len(file_content),
-            "mime_type": mime_type,
+            **result,
             "processing_status": "File uploaded - ready for AI analysis"
         })
         
@@ -713,18 +1292,14 @@ def rename_file():
             logger.warning("Invalid bearer token for /rename-file")
             return jsonify({"error": "Unauthorized"}), 401
         
-        # Validate webhook signature if configured
-        if WEBHOOK_SECRET:
-            signature = request.headers.get('X-Hub-Signature-256')
-            if not validate_webhook_signature(request.get_data(), signature):
-                logger.warning("Invalid webhook signature for /rename-file")
-                return jsonify({"error": "Invalid signature"}), 401
+        data, error_response = load_signed_json('/rename-file')
+        if error_response:
+            return error_response
         
-        data = request.json
         logger.info(f"File rename request: file_id={data.get('file_id')}, new_name={data.get('new_name')}")
         
         # Validate required fields
-        is_valid, error_msg = validate_request_data(data, ['file_id', 'new_name'])
+        is_valid, error_msg = validate_request_data(data, REQUIRED_RENAME_FIELDS)
         if not is_valid:
             logger.warning(f"Invalid rename request data: {error_msg}")
             return jsonify({"error": error_msg}), 400
@@ -756,18 +1331,14 @@ def auto_rename_file():
             logger.warning("Invalid bearer token for /auto-rename-file")
             return jsonify({"error": "Unauthorized"}), 401
         
-        # Validate webhook signature if configured
-        if WEBHOOK_SECRET:
-            signature = request.headers.get('X-Hub-Signature-256')
-            if not validate_webhook_signature(request.get_data(), signature):
-                logger.warning("Invalid webhook signature for /auto-rename-file")
-                return jsonify({"error": "Invalid signature"}), 401
+        data, error_response = load_signed_json('/auto-rename-file')
+        if error_response:
+            return error_response
         
-        data = request.json
         logger.info(f"Auto-rename request: file_id={data.get('file_id')}, new_name={data.get('new_name')}")
         
         # Validate required fields
-        is_valid, error_msg = validate_request_data(data, ['file_id', 'new_name'])
+        is_valid, error_msg = validate_request_data(data, REQUIRED_RENAME_FIELDS)
         if not is_valid:
             logger.warning(f"Invalid auto-rename request data: {error_msg}")
             return jsonify({"error": error_msg}), 400
@@ -832,16 +1403,16 @@ def serve_attachment(filename):
             return jsonify({"error": "File not found"}), 404
         
         # Determine MIME type
-        mime_type = 'application/octet-stream'
-        if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
-            mime_type = f'image/{filename.split(".")[-1].lower()}'
-        elif filename.lower().endswith('.pdf'):
-            mime_type = 'application/pdf'
-        elif filename.lower().endswith(('.txt', '.md')):
-            mime_type = 'text/plain'
+        mime_type = ATTACHMENT_MIME_TYPES.get(os.path.splitext(filename)[1].lower(), 'application/octet-stream')
         
-        # Send file
-        return send_file(file_path, mimetype=mime_type, as_attachment=False)
+        if ATTACHMENTS_ACCEL_PREFIX:
+            # nginx sends the bytes itself (sendfile) from its internal location
+            response = app.response_class(mimetype=mime_type)
+            response.headers['X-Accel-Redirect'] = f"{ATTACHMENTS_ACCEL_PREFIX}/{quote(filename)}"
+            return response
+        
+        # Send file - gunicorn streams it with sendfile(); ETag/Last-Modified allow 304s on re-fetch
+        return send_file(file_path, mimetype=mime_type, as_attachment=False, conditional=True, etag=True)
         
     except Exception as e:
         logger.error(f"Error serving attachment {filename}: {str(e)}")
@@ -855,12 +1426,13 @@ def list_temp_files():
         total_size = 0
         
         if os.path.exists(TEMP_FILES_DIR):
-            for filename in os.listdir(TEMP_FILES_DIR):
-                filepath = os.path.join(TEMP_FILES_DIR, filename)
-                if os.path.isfile(filepath):
-                    stat = os.stat(filepath)
+            with os.scandir(TEMP_FILES_DIR) as entries:
+                for entry in entries:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    stat = entry.stat()
                     files.append({
-                        "name": filename,
+                        "name": entry.name,
                         "size": stat.st_size,
                         "created": datetime.datetime.fromtimestamp(stat.st_ctime).isoformat(),
                         "modified": datetime.datetime.fromtimestamp(stat.st_mtime).isoformat()
@@ -903,13 +1475,15 @@ def check_file_permissions():
         file_id = data.get('file_id')
         
         try:
-            service = get_drive_service()
+            # Try to get permissions list (shows what access we have) - runs on the
+            # Drive pool alongside the metadata request below
+            permissions_future = DRIVE_EXECUTOR.submit(
+                lambda: get_drive_service().permissions().list(fileId=file_id, supportsAllDrives=True).execute()
+            )
             
             # Try to get file metadata (read permission test) - supportsAllDrives for Shared Drives
-            file_info = service.files().get(fileId=file_id, supportsAllDrives=True).execute()
-
-            # Try to get permissions list (shows what access we have)
-            permissions = service.permissions().list(fileId=file_id, supportsAllDrives=True).execute()
+            file_info = get_drive_service().files().get(fileId=file_id, supportsAllDrives=True).execute()
+            permissions = permissions_future.result()
             
             # Check what our service account can do
             service_email = None
@@ -980,7 +1554,7 @@ def auto_delete_file():
             return jsonify({"error": "No data provided"}), 400
 
         # Validate request data
-        is_valid, error_msg = validate_request_data(data, ['file_id'])
+        is_valid, error_msg = validate_request_data(data, REQUIRED_FILE_FIELDS)
         if not is_valid:
             logger.warning(f"Invalid auto-delete request data: {error_msg}")
             return jsonify({"error": error_msg}), 400
@@ -1015,14 +1589,9 @@ def upload_to_drive_endpoint():
             logger.warning("Invalid bearer token for /upload-to-drive")
             return jsonify({"error": "Unauthorized"}), 401
 
-        # Validate webhook signature if configured
-        if WEBHOOK_SECRET:
-            signature = request.headers.get('X-Hub-Signature-256')
-            if not validate_webhook_signature(request.get_data(), signature):
-                logger.warning("Invalid webhook signature for /upload-to-drive")
-                return jsonify({"error": "Invalid signature"}), 401
-
-        data = request.json
+        data, error_response = load_signed_json('/upload-to-drive')
+        if error_response:
+            return error_response
 
         # Validate required fields
         # Note: attachment_url or attachment_urls required (at least one)
@@ -1050,62 +1619,25 @@ def upload_to_drive_endpoint():
         results = []
         errors = []
 
-        for idx, url in enumerate(attachment_urls):
-            try:
-                # Use custom filename if provided, otherwise extract from URL
-                custom_filename = filenames[idx] if idx < len(filenames) else None
-
-                # Download from Airtable URL
-                logger.info(f"Processing attachment {idx + 1}/{len(attachment_urls)}")
-                file_content, filename, mime_type, download_error = download_from_url(url)
-
-                if download_error:
-                    errors.append({
-                        "url": url[:100],
-                        "error": download_error,
-                        "index": idx
-                    })
-                    continue
-
-                # Use custom filename if provided
-                if custom_filename:
-                    # Preserve extension from original filename
-                    original_ext = filename.split('.')[-1] if '.' in filename else ''
-                    custom_ext = custom_filename.split('.')[-1] if '.' in custom_filename else ''
-
-                    # If custom filename has no extension but original does, add it
-                    if not custom_ext and original_ext:
-                        filename = f"{custom_filename}.{original_ext}"
-                    else:
-                        filename = custom_filename
-
-                # Upload to Google Drive
-                success, upload_result = upload_to_drive(file_content, filename, folder_id, mime_type)
-
-                if success:
-                    result_data = {
-                        "success": True,
-                        "index": idx,
-                        "source_url": url[:100],
-                        **upload_result
-                    }
-                    results.append(result_data)
-                    logger.info(f"Successfully uploaded file {idx + 1}: {upload_result.get('file_id')}")
-                else:
-                    errors.append({
-                        "url": url[:100],
-                        "error": upload_result,
-                        "index": idx
-                    })
-                    logger.error(f"Failed to upload file {idx + 1}: {upload_result}")
-
-            except Exception as file_error:
-                errors.append({
-                    "url": url[:100],
-                    "error": str(file_error),
-                    "index": idx
-                })
-                logger.error(f"Error processing file {idx + 1}: {str(file_error)}")
+        # Download/upload attachments concurrently - each transfer is network-bound
+        futures = [
+            ATTACHMENT_EXECUTOR.submit(
+                transfer_attachment_to_drive,
+                idx,
+                len(attachment_urls),
+                url,
+                filenames[idx] if idx < len(filenames) else None,
+                folder_id
+            )
+            for idx, url in enumerate(attachment_urls)
+        ]
+
+        for future in futures:
+            success, item = future.result()
+            if success:
+                results.append(item)
+            else:
+                errors.append(item)
 
         # Prepare response
         response_data = {
@@ -1141,15 +1673,14 @@ def upload_to_drive_endpoint():
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
-    # Load environment variables
-    load_env()
+    # .env was already loaded at import and the config bound to module constants
     
     # Get port from environment or default
     port = int(os.environ.get('PORT', 5001))
     
-    # Validate setup
-    required_vars = ['AIRTABLE_API_KEY', 'AIRTABLE_BASE_ID']
-    missing_vars = [var for var in required_vars if not os.getenv(var)]
+    # Validate setup (against the values already read at import)
+    required_vars = (('AIRTABLE_API_KEY', AIRTABLE_API_KEY), ('AIRTABLE_BASE_ID', AIRTABLE_BASE_ID))
+    missing_vars = [name for name, value in required_vars if not value]
     
     if missing_vars:
         logger.error(f"Missing environment variables: {', '.join(missing_vars)}")
@@ -1163,23 +1694,51 @@ if __name__ == '__main__':
     cleanup_old_temp_files()
     
     # Log startup information
-    logger.info(f"Starting PRODUCTION Drive-Airtable Vision Integration Server")
-    logger.info(f"Version: 2026-01-18 (Added Airtable-to-Drive upload endpoint)")
-    logger.info(f"Port: {port}")
-    logger.info(f"Debug mode: {'enabled' if DEBUG_SAVE_FILES else 'disabled'}")
-    logger.info(f"Bearer token auth: {'enabled' if FLASK_SERVER_TOKEN else 'disabled'}")
-    logger.info(f"Webhook signature: {'enabled' if WEBHOOK_SECRET else 'disabled'}")
-    logger.info(f"Temp files directory: {TEMP_FILES_DIR}")
-
-    print("🚀 PRODUCTION Flask server starting...")
-    print(f"📊 Health check: http://localhost:{port}/health")
-    print(f"📁  File upload endpoint: POST http://localhost:{port}/download-and-analyze-vision")
-    print(f"⬇️  Download endpoint: POST http://localhost:{port}/download-and-analyze")
-    print(f"✏️  Rename endpoint: POST http://localhost:{port}/rename-file")
-    print(f"🔄  Auto-rename endpoint: POST http://localhost:{port}/auto-rename-file")
-    print(f"⬆️  Upload to Drive endpoint: POST http://localhost:{port}/upload-to-drive")
-    print(f"🔐 Security: {'Bearer token required' if FLASK_SERVER_TOKEN else 'No auth'} | {'Webhook signatures' if WEBHOOK_SECRET else 'No signatures'}")
-    print(f"📁 Temp files: {TEMP_FILES_DIR} (debug: {'enabled' if DEBUG_SAVE_FILES else 'disabled'})")
+    logger.info("\n".join([
+        "Starting PRODUCTION Drive-Airtable Vision Integration Server",
+        "Version: 2026-01-18 (Added Airtable-to-Drive upload endpoint)",
+        f"Port: {port}",
+        f"Debug mode: {'enabled' if DEBUG_SAVE_FILES else 'disabled'}",
+        f"Bearer token auth: {'enabled' if FLASK_SERVER_TOKEN else 'disabled'}",
+        f"Webhook signature: {'enabled' if WEBHOOK_SECRET else 'disabled'}",
+        f"Temp files directory: {TEMP_FILES_DIR}",
+    ]))
+
+    # Banner goes out in a single write (flushed, since execv below discards unflushed stdout)
+    sys.stdout.write("\n".join([
+        "🚀 PRODUCTION Flask server starting...",
+        f"📊 Health check: http://localhost:{port}/health",
+        f"📁  File upload endpoint: POST http://localhost:{port}/download-and-analyze-vision",
+        f"⬇️  Download endpoint: POST http://localhost:{port}/download-and-analyze",
+        f"✏️  Rename endpoint: POST http://localhost:{port}/rename-file",
+        f"🔄  Auto-rename endpoint: POST http://localhost:{port}/auto-rename-file",
+        f"⬆️  Upload to Drive endpoint: POST http://localhost:{port}/upload-to-drive",
+        f"🔐 Security: {'Bearer token required' if FLASK_SERVER_TOKEN else 'No auth'} | {'Webhook signatures' if WEBHOOK_SECRET else 'No signatures'}",
+        f"📁 Temp files: {TEMP_FILES_DIR} (debug: {'enabled' if DEBUG_SAVE_FILES else 'disabled'})",
+    ]) + "\n")
+    sys.stdout.flush()
+    
+    # gunicorn may be installed in lib/ (see the sys.path setup above)
+    gunicorn_available = importlib.util.find_spec('gunicorn') is not None
     
-    # Run the server in production mode
-    app.run(debug=False, host='0.0.0.0', port=port)
\ No newline at end of file
+    if os.environ.get('FLASK_DEV') or not gunicorn_available:
+        if not os.environ.get('FLASK_DEV'):
+            logger.error("gunicorn is not installed - falling back to the single-process Flask server")
+        # Local development only - single-process Werkzeug server
+        app.run(debug=False, host='0.0.0.0', port=port)
+    else:
+        # Production: replace this process with gunicorn (settings in gunicorn_conf.py)
+        app_dir = os.path.dirname(os.path.abspath(__file__))
+        
+        # The new interpreter doesn't inherit our sys.path - pass lib/ on via PYTHONPATH
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(
+            filter(None, [os.path.join(app_dir, 'lib'), env.get('PYTHONPATH')])
+        )
+        os.execve(sys.executable, [
+            sys.executable, '-m', 'gunicorn',
+            '--chdir', app_dir,
+            '--config', os.path.join(app_dir, 'gunicorn_conf.py'),
+            '--bind', f'0.0.0.0:{port}',
+            'wsgi:app'
+        ], env)
@@ -39,14 +39,26 @@ import sys
 import os
 import argparse
 import csv
-import json
+import random
 import re
+import time
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+try:
+    from orjson import loads as json_loads
+except ImportError:  # Fall back to the stdlib parser
+    from json import loads as json_loads
 
 # Configuration
 GOOGLE_CREDENTIALS_PATH = 'google_credentials.json'
 SCOPES = ['https://www.googleapis.com/auth/drive']
+# File ID in share URLs: .../file/d/<id>/view or ...?id=<id>
+FILE_ID_RE = re.compile(r'(?:/d/|id=)([a-zA-Z0-9_-]+)')
+DRIVE_BATCH_SIZE = 100  # Drive's limit of sub-requests per batch call
+RATE_LIMIT_MAX_ATTEMPTS = 5  # Tries per rename when Drive answers 403 rateLimitExceeded / 429
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
 
 def get_drive_service():
     """Initialize Google Drive service"""
@@ -62,45 +74,20 @@ def get_drive_service():
 
 def extract_file_id_from_url(url):
     """Extract file ID from Google Drive URL"""
-    patterns = [
-        r'/d/([a-zA-Z0-9-_]+)',  # Standard share URL
-        r'id=([a-zA-Z0-9-_]+)',   # Alternative format
-        r'file/d/([a-zA-Z0-9-_]+)',  # Another format
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match:
-            return match.group(1)
-    
-    return None
-
-def get_file_info(drive_service, file_id):
-    """Get current file information"""
-    try:
-        file_info = drive_service.files().get(fileId=file_id).execute()
-        return file_info
-    except Exception as e:
-        print(f"❌ Error getting file info for {file_id}: {e}")
-        return None
+    match = FILE_ID_RE.search(url)
+    return match.group(1) if match else None
 
 def rename_file(drive_service, file_id, new_name):
     """Rename a file in Google Drive"""
     try:
-        # Get current file info first
-        current_file = get_file_info(drive_service, file_id)
-        if not current_file:
-            return False, "Could not retrieve current file information"
-        
-        current_name = current_file.get('name', 'Unknown')
-        print(f"  Current: '{current_name}'")
         print(f"  New: '{new_name}'")
         
-        # Update the file name
+        # Update the file name - a single PATCH returning just the new name
         body = {'name': new_name}
         updated_file = drive_service.files().update(
             fileId=file_id,
-            body=body
+            body=body,
+            fields='id,name'
         ).execute()
         
         return True, f"Renamed to: {updated_file.get('name')}"
@@ -108,6 +95,17 @@ def rename_file(drive_service, file_id, new_name):
     except Exception as e:
         return False, f"Error renaming file: {str(e)}"
 
+def is_rate_limited(exception):
+    """Whether a Drive error is a rate limit (429, or 403 with a rate-limit reason)"""
+    if not isinstance(exception, HttpError):
+        return False
+    if exception.resp.status == 429:
+        return True
+    if exception.resp.status != 403:
+        return False
+    details = exception.error_details if isinstance(exception.error_details, list) else []
+    return any(isinstance(d, dict) and d.get('reason') in RATE_LIMIT_REASONS for d in details)
+
 def process_single_file(drive_service, file_id, new_name):
     """Process a single file rename"""
     print(f"\n📁 Processing file ID: {file_id}")
@@ -120,30 +118,96 @@ def process_single_file(drive_service, file_id, new_name):
     
     return success
 
+def rename_files_batch(drive_service, renames):
+    """Rename many files with Drive batch requests (up to 100 renames per HTTP call)
+    
+    renames: list of (file_id, new_name) tuples
+    Returns the number of files renamed successfully.
+    
+    Renames rejected by Drive's rate limit are sent again in a later batch,
+    after an exponential backoff with jitter, up to RATE_LIMIT_MAX_ATTEMPTS tries.
+    """
+    success_count = 0
+    output_lines = []  # Results are written once per batch instead of print() per line
+    retry_indexes = []
+    attempt = 0
+    
+    def on_done(request_id, response, exception):
+        nonlocal success_count
+        index = int(request_id)
+        file_id, new_name = renames[index]
+        if exception is not None and is_rate_limited(exception) and attempt + 1 < RATE_LIMIT_MAX_ATTEMPTS:
+            retry_indexes.append(index)
+            return
+        output_lines.append(f"\n📁 File ID: {file_id} -> '{new_name}'\n")
+        if exception is not None:
+            output_lines.append(f"❌ ERROR: Error renaming file: {exception}\n")
+        else:
+            output_lines.append(f"✅ SUCCESS: Renamed to: {response.get('name')}\n")
+            success_count += 1
+    
+    pending = list(range(len(renames)))
+    while pending:
+        for start in range(0, len(pending), DRIVE_BATCH_SIZE):
+            batch = drive_service.new_batch_http_request(callback=on_done)
+            for index in pending[start:start + DRIVE_BATCH_SIZE]:
+                file_id, new_name = renames[index]
+                batch.add(
+                    drive_service.files().update(fileId=file_id, body={'name': new_name}, fields='name'),
+                    request_id=str(index)
+                )
+            batch.execute()
+            
+            sys.stdout.write(''.join(output_lines))
+            sys.stdout.flush()
+            output_lines.clear()
+        
+        pending = sorted(retry_indexes)
+        retry_indexes.clear()
+        if pending:
+            delay = 2 ** attempt + random.random()
+            print(f"⏳ Rate limited on {len(pending)} file(s), retrying in {delay:.1f}s...")
+            time.sleep(delay)
+            attempt += 1
+    
+    return success_count
+
 def process_csv_file(drive_service, csv_file):
     """Process CSV file with file_id,new_name format"""
     if not os.path.exists(csv_file):
         print(f"❌ CSV file not found: {csv_file}")
         return False
     
+    renames = []
     success_count = 0
     total_count = 0
     
     try:
         with open(csv_file, 'r', newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
+            reader = csv.reader(f)
+            header = [column.strip() for column in next(reader, [])]
+            if 'file_id' not in header or 'new_name' not in header:
+                print(f"❌ CSV file must have file_id and new_name columns")
+                return False
+            id_index = header.index('file_id')
+            name_index = header.index('new_name')
+            row_width = max(id_index, name_index) + 1
             
             for row in reader:
                 total_count += 1
-                file_id = row.get('file_id', '').strip()
-                new_name = row.get('new_name', '').strip()
+                if len(row) < row_width:
+                    print(f"❌ Skipping row {total_count}: Missing file_id or new_name")
+                    continue
+                file_id = row[id_index].strip()
+                new_name = row[name_index].strip()
                 
                 if not file_id or not new_name:
                     print(f"❌ Skipping row {total_count}: Missing file_id or new_name")
                     continue
                 
-                if process_single_file(drive_service, file_id, new_name):
-                    success_count += 1
+                renames.append((file_id, new_name))
+        
+        success_count = rename_files_batch(drive_service, renames)
     
     except Exception as e:
         print(f"❌ Error processing CSV file: {e}")
@@ -158,12 +222,13 @@ def process_json_file(drive_service, json_file):
         print(f"❌ JSON file not found: {json_file}")
         return False
     
+    renames = []
     success_count = 0
     total_count = 0
     
     try:
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        with open(json_file, 'rb') as f:
+            data = json_loads(f.read())
         
         if not isinstance(data, list):
             print(f"❌ JSON file must contain an array of objects")
@@ -183,8 +248,9 @@ def process_json_file(drive_service, json_file):
                 print(f"❌ Skipping item {total_count}: Missing file_id or new_name")
                 continue
             
-            if process_single_file(drive_service, file_id, new_name):
-                success_count += 1
+            renames.append((file_id, new_name))
+        
+        success_count = rename_files_batch(drive_service, renames)
     
     except Exception as e:
         print(f"❌ Error processing JSON file: {e}")
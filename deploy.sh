@@ -47,7 +47,6 @@ echo "Installing dependencies..."
 source venv/bin/activate
 pip install --upgrade pip
 pip install -r requirements.txt
-pip install gunicorn
 
 # Create systemd service file
 echo "Creating systemd service..."
@@ -61,7 +60,7 @@ User=$USER
 Group=$USER
 WorkingDirectory=/home/$USER/drive-airtable
 Environment="PATH=/home/$USER/drive-airtable/venv/bin"
-ExecStart=/home/$USER/drive-airtable/venv/bin/gunicorn --workers 3 --bind 0.0.0.0:5000 app:app
+ExecStart=/home/$USER/drive-airtable/venv/bin/gunicorn --config gunicorn_conf.py --bind 0.0.0.0:5000 wsgi:app
 Restart=always
 
 [Install]
@@ -0,0 +1,31 @@
+"""
+Gunicorn settings for the Drive-Airtable server.
+
+Run with: gunicorn -c gunicorn_conf.py wsgi:app
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5001)}"
+
+# Requests mostly wait on Drive downloads and Airtable uploads - (2 x cores) + 1 workers
+workers = int(os.environ.get('GUNICORN_WORKERS', (os.cpu_count() or 1) * 2 + 1))
+
+# gthread by default; GUNICORN_WORKER_CLASS=gevent uses greenlets (gunicorn monkey-patches
+# sockets and threads, so Drive/Airtable calls yield while waiting). Base64-encoding uploads
+# and writing downloads to disk never yield and stall a gevent worker's whole loop, so
+# gthread stays the default and gevent is an optional install ('pip install gevent').
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = 8
+worker_connections = 1000
+
+# Downloading a large Drive file and uploading it to Airtable can take well over the 30s default
+timeout = 120
+keepalive = 75
+worker_tmp_dir = '/dev/shm'
+
+
+def post_worker_init(worker):
+    """Set up the Google clients in each worker so the first webhook doesn't pay for it"""
+    from app import warm_up_drive_clients
+    warm_up_drive_clients()
@@ -19,6 +19,8 @@ from googleapiclient.discovery import build
 # Configuration
 GOOGLE_CREDENTIALS_PATH = 'google_credentials.json'
 SCOPES = ['https://www.googleapis.com/auth/drive']
+# File ID in share URLs: .../file/d/<id>/view or ...?id=<id>
+FILE_ID_RE = re.compile(r'(?:/d/|id=)([a-zA-Z0-9_-]+)')
 
 def get_drive_service():
     """Initialize Google Drive service"""
@@ -34,23 +36,19 @@ def get_drive_service():
 
 def extract_file_id_from_url(url):
     """Extract file ID from Google Drive URL"""
-    patterns = [
-        r'/d/([a-zA-Z0-9-_]+)',  # Standard share URL
-        r'id=([a-zA-Z0-9-_]+)',   # Alternative format
-        r'file/d/([a-zA-Z0-9-_]+)',  # Another format
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match:
-            return match.group(1)
-    
-    return None
+    match = FILE_ID_RE.search(url)
+    return match.group(1) if match else None
+
+# Successful lookups are remembered for the session (entries dropped after a rename)
+_file_info_cache = {}
 
 def get_file_info(drive_service, file_id):
     """Get current file information"""
+    if file_id in _file_info_cache:
+        return _file_info_cache[file_id]
     try:
-        file_info = drive_service.files().get(fileId=file_id).execute()
+        file_info = drive_service.files().get(fileId=file_id, fields='id,name,mimeType').execute()
+        _file_info_cache[file_id] = file_info
         return file_info
     except Exception as e:
         print(f"❌ Error getting file info: {e}")
@@ -169,6 +167,7 @@ def main():
         success, message = rename_file(drive_service, file_id, new_name)
         
         if success:
+            _file_info_cache.pop(file_id, None)
             print(f"✅ {message}")
         else:
             print(f"❌ {message}")
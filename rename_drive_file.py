@@ -39,28 +39,25 @@ def get_drive_service():
 def get_file_info(drive_service, file_id):
     """Get current file information"""
     try:
-        file_info = drive_service.files().get(fileId=file_id).execute()
+        file_info = drive_service.files().get(fileId=file_id, fields='id,name').execute()
         return file_info
     except Exception as e:
         print(f"Error getting file info: {e}")
         return None
 
-def rename_file(drive_service, file_id, new_name):
-    """Rename a file in Google Drive"""
+def rename_file(drive_service, file_id, new_name, current_name=None):
+    """Rename a file in Google Drive (current_name is only used for display)"""
     try:
-        # Get current file info first
-        current_file = get_file_info(drive_service, file_id)
-        if not current_file:
-            return False, "Could not retrieve current file information"
-        
-        print(f"Current file name: '{current_file.get('name')}'")
+        if current_name is not None:
+            print(f"Current file name: '{current_name}'")
         print(f"New file name: '{new_name}'")
         
-        # Update the file name
+        # Update the file name - a single PATCH returning just the new name
         body = {'name': new_name}
         updated_file = drive_service.files().update(
             fileId=file_id,
-            body=body
+            body=body,
+            fields='id,name'
         ).execute()
         
         return True, f"File renamed successfully to: {updated_file.get('name')}"
@@ -101,7 +98,7 @@ def main():
     
     # Rename the file
     print(f"Renaming file...")
-    success, message = rename_file(drive_service, file_id, new_name)
+    success, message = rename_file(drive_service, file_id, new_name, current_file.get('name'))
     
     if success:
         print(f"✅ SUCCESS: {message}")
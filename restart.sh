@@ -5,7 +5,8 @@
 echo "🔄 Restarting Drive-Airtable Flask app..."
 
 # Find and kill the existing process
-PID=$(ps aux | grep "python3 app.py" | grep -v grep | awk '{print $2}')
+# (app.py execs gunicorn, so match either command line)
+PID=$(pgrep -f "python3 app.py|wsgi:app")
 if [ ! -z "$PID" ]; then
     echo "Stopping existing process (PID: $PID)..."
     kill $PID
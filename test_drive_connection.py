@@ -54,7 +54,7 @@ def test_drive_connection():
         # Query for files the service account has access to
         results = drive_service.files().list(
             pageSize=10,
-            fields="nextPageToken, files(id, name, mimeType, owners)"
+            fields="files(id, name, mimeType, owners(displayName))"
         ).execute()
         
         files = results.get('files', [])
@@ -92,7 +92,10 @@ def test_drive_connection():
         
         try:
             print(f"🔍 Testing file metadata retrieval for: {test_file.get('name')}")
-            file_info = drive_service.files().get(fileId=file_id).execute()
+            file_info = drive_service.files().get(
+                fileId=file_id,
+                fields='name, size, modifiedTime, createdTime'
+            ).execute()
             print("✅ File metadata retrieval successful")
             
             # Show some file details
@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+"""
+WSGI entry point for the Drive-Airtable server.
+
+Run with: gunicorn -c gunicorn_conf.py wsgi:app
+"""
+
+from app import app
+
+if __name__ == '__main__':
+    app.run()